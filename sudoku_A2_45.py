@@ -1,206 +1,178 @@
 import sys
-import copy
-
-def is_all_unique(assignment, positions):
-    """ assignment is dict of position:value, positions is a list of tuples"""
-    return all(assignment[p1] != assignment[p2]
-		    for p1 in positions
-	 		  for p2 in positions if p1 != p2)
+from array import array
+from collections import deque
 
 def row_to_indices(row):
     """Returns a list of positions in this row.
-    A position is a tuple"""
-    return [(row, col) for col in range(0, 9)]
+    A position is the flat index row * 9 + col"""
+    return [row * 9 + col for col in range(0, 9)]
 
 def col_to_indices(col):
     """Returns a list of positions in this column.
-    A position is a tuple"""
-    return [(row, col) for row in range(0, 9)]
+    A position is the flat index row * 9 + col"""
+    return [row * 9 + col for row in range(0, 9)]
 
 def box_to_indices(box):
     """Returns a list of positions in this box.
-    A position is a tuple"""
+    A position is the flat index row * 9 + col"""
     start_row = (box // 3) * 3
     start_col = (box % 3) * 3
-    return [(row, col) for row in range(start_row, start_row + 3)
-                       for col in range(start_col, start_col + 3)]
+    return [row * 9 + col for row in range(start_row, start_row + 3)
+                          for col in range(start_col, start_col + 3)]
+
+def iter_bits(mask):
+    """Yields each set bit of mask as its own single-bit mask, lowest first.
+    The digit of a single bit b is b.bit_length()"""
+    while mask:
+        bit = mask & -mask
+        yield bit
+        mask ^= bit
 	
-class Constraint(object):
-    """A Constraint consists of
-    * scope: is a list of tuples. A tuple represents a position in the grid
-    * condition: a function that can be applied to a tuple of values for
-    the variable
-    """
-    def __init__(self, scope, condition):
-        self.scope = scope
-        self.condition = condition
-  
-    def holds(self, assignment):
-        """
-        precondition: all variables are assigned in assignment
-        """
-        return self.condition(assignment, self.scope)
-    
-class CSP(object):
+# The units (rows, columns and boxes) and peers are the same for every
+# puzzle, so they are built once when the module is loaded.
+UNITS = tuple(tuple(row_to_indices(i)) for i in range(0, 9)) + \
+        tuple(tuple(col_to_indices(j)) for j in range(0, 9)) + \
+        tuple(tuple(box_to_indices(q)) for q in range(0, 9))
+# PEERS[var] holds every other variable sharing a unit with var.
+PEERS = tuple(tuple(sorted(set(nvar for unit in UNITS if var in unit
+                                    for nvar in unit if nvar != var)))
+              for var in range(0, 81))
+# CELL_UNITS[var] holds the indices into UNITS of the row, column and box of var.
+CELL_UNITS = tuple(tuple(u for u in range(0, 27) if var in UNITS[u])
+                   for var in range(0, 81))
+# POPCOUNT[mask] is the number of values left in a 9-bit domain mask.
+POPCOUNT = bytes(bin(i).count("1") for i in range(512))
+# DIGIT_MASK[digit] is the initial domain of a cell holding digit (0 = empty).
+DIGIT_MASK = (0x1FF,) + tuple(1 << (digit - 1) for digit in range(1, 10))
+
+# The solver is specialised to 9x9 Sudoku: every constraint is an AllDifferent
+# over one of the UNITS, so propagation works directly on PEERS and UNITS
+# instead of going through generic constraint objects.
+def _propagate(domains, to_do):
     """
-    A CSP consists of
-    * domains, a dictionary that maps each variable to its domain
-    * constraints, a list of constraints
-    * variables, a set of variables. A variable is a tuple (row, col)
-    * var_to_const, a variable to set of constraints dictionary
-    (the arc linking a variable to its constraint)
+    domains is an array of 81 domain masks indexed by variable, and is
+    modified in place. to_do is an iterable of variables whose domains
+    have changed.
+    Makes domains arc-consistent and assigns hidden singles.
+    Returns False as soon as a domain is wiped out or a digit has no
+    possible cell left in some unit, True otherwise.
     """
-    def __init__(self, domains, constraints):
-        """
-        domains is a variable:domain dictionary.
-        constraints is a list of constraints.
-        """
-        self.variables = set(domains) # Retrieves the key set.
-        self.domains = domains
-        self.constraints = constraints
-        self.var_to_const = dict([var, set()] for var in self.variables) # dict comprehension not introduced in python <= 2.6
-        for con in constraints:
-            for var in con.scope:
-                self.var_to_const[var].add(con)
-    
-    def consistent(self, puzzle):
-        """
-        assignment is a variable:value dictionary
-        returns True if all of the constraints that can be 
-        evaluated evaluate to True given assignment.
-        """
-        return all(con.holds(puzzle, con.scope) for con in self.constraints)
-      
-class Solver:
-    """ Solve by first making csp arc-consistent."""
-    def __init__(self, csp):
-        self.csp = csp
-
-    #call this 'arc'
-    def new_to_do(self, var, const):
-        """
-        returns a set of arcs, (nvar, nconst), where nvar is neighbour of var
-        and nconst is another constraint of var.
-        """
-        return set((nvar, nconst) for nconst in self.csp.var_to_const[var]
-                if nconst != const
-                for nvar in nconst.scope
-                if nvar != var)
-            
-    def make_arc_consistent(self, orig_domains=None, to_do=None):
-        if orig_domains is None:
-            orig_domains = self.csp.domains
-
-        if to_do is None:
-            to_do = set((var, const) for const in self.csp.constraints for var in const.scope)
-        else:
-            to_do = to_do.copy()
-        domains = orig_domains.copy()
+    to_do = deque(to_do)
+    # in_queue[var] is 1 while var is waiting in to_do, so membership is
+    # kept up to date in place rather than through set unions.
+    in_queue = bytearray(81)
+    # dirty[u] is 1 if a cell of UNITS[u] changed since the unit was last
+    # checked for hidden singles; untouched units cannot have new ones.
+    dirty = bytearray(27)
+    for var in to_do:
+        in_queue[var] = 1
+        for u in CELL_UNITS[var]:
+            dirty[u] = 1
+    while to_do:
         while to_do:
-            var, const = self.select_arc(to_do)
-            other_vars = [ov for ov in const.scope if ov != var]
-            # Perform Revise(domain). O(d^n) for n-ary CSP
-            new_domain = set(val for val in domains[var] if self.any_holds(domains, const, dict([[var,val]]), other_vars))
-            if new_domain != domains[var]:
-                domains[var] = new_domain
-                add_to_do = self.new_to_do(var, const) - to_do # new todos not already inside
-                to_do = to_do | add_to_do # set union
-        return domains
-		
-    def select_arc(self, to_do):
-        return to_do.pop()
-        
-    # O(d^n-1) for n-ary CSP. Basically this methods try every combination
-    # of values for other variables in the scope.
-    def any_holds(self, domains, const, env, other_vars, ind=0, assigned_vars=[]):
-        """
-        returns True if Constraint const holds for an assignment
-        that extends env with the variables in other_vars[ind:].
-        env is a dictionary
-        Warning: this has side effects and changes the elements of env
-        """
-        # All the variables in the scope of the constraints has been assigned.
-        if ind == len(other_vars): 
-            return const.holds(env)
-        else:
-            var = other_vars[ind]
-            for val in domains[var]:
-                env[var] = val
-                if is_all_unique(env, [var] + assigned_vars) and self.any_holds(domains, const, env, other_vars, ind + 1, [var] + assigned_vars):
-                    return True
-            return False
-        
-    # solve by domain-splitting -> keep attempting to make the csp arc-consistent after each splitting.
-    def solve_recursive_ds(self, domains=None, to_do=None):
-        """returns one solution (dict of var:val) or False if there are no solutions
-        to_do is the list of CSP arcs to check
-        """
-        if domains is None:
-            domains = self.csp.domains
-        new_domains = self.make_arc_consistent(domains, to_do)
-        if any(len(new_domains[var]) == 0 for var in domains):
-            return False
-        elif all(len(new_domains[var]) == 1 for var in domains):
-            return dict((var, self.select_first(new_domains[var])) for var in domains) # solution - a dictionary of variable (tuple) as key, value (int) as value.
-        else:
-            var = self.select_most_constrained_var(x for x in self.csp.variables if len(new_domains[x]) > 1)
-            if var:
-                dom1, dom2 = self.partition_domain(new_domains[var])
-                new_dom1 = self.copy_with_assign(new_domains, var, dom1)
-                new_dom2 = self.copy_with_assign(new_domains, var, dom2)
-                to_do = self.new_to_do(var, None)
-                return self.solve_recursive_ds(new_dom1, to_do) or self.solve_recursive_ds(new_dom2, to_do)
-
-    def select_var(self, iterables):
-        """returns the next variable to split"""
-        return self.select_first(iterables)
-    
-    def select_most_constrained_var(self, iterables):
-        """returns the the variable with the most constrained domain"""
-        return self.select_first([var for var in iterables if len(self.csp.domains[var]) == min(len(self.csp.domains[i]) for i in iterables)])
-    
-    def partition_domain(self, dom):
-        """partitions domain dom into two."""
-        split = len(dom) // 2
-        dom1 = set(list(dom)[0:split])
-        dom2 = dom - dom1
-        return dom1, dom2
-
-    def copy_with_assign(self, domains, var=None, new_domain=set()):
-        """create a copy of the domains with an assignment var=new_domain
-        if var==None then it is just a copy.
-        """
-        newdoms = domains.copy()
-        if var is not None:
-              newdoms[var] = new_domain
-        return newdoms
-
-    def select_first(self, iterables):
-        for iterable in iterables:
-            return iterable
+            var = to_do.popleft()
+            in_queue[var] = 0
+            # Domains are 9-bit masks: bit i set means digit i+1 is possible.
+            val = domains[var]
+            if val & (val - 1): # not a singleton, nothing to remove from peers
+                continue
+            # Revise each peer against var: under AllDifferent the only
+            # unsupported value is the one var is fixed to. O(peers).
+            for peer in PEERS[var]:
+                d = domains[peer]
+                if d & val:
+                    d &= ~val
+                    if d == 0: # dead branch, stop propagating
+                        return False
+                    domains[peer] = d
+                    for u in CELL_UNITS[peer]:
+                        dirty[u] = 1
+                    if d & (d - 1) == 0 and not in_queue[peer]: # newly fixed
+                        in_queue[peer] = 1
+                        to_do.append(peer)
+        # Hidden singles: fold each unit into the digits seen at least
+        # once and at least twice; once & ~twice appear in exactly one cell.
+        for u in range(0, 27):
+            if not dirty[u]:
+                continue
+            dirty[u] = 0
+            unit = UNITS[u]
+            once = twice = 0
+            for var in unit:
+                d = domains[var]
+                twice |= once & d
+                once |= d
+            if once != 0x1FF: # some digit cannot be placed in this unit
+                return False
+            for val in iter_bits(once & ~twice):
+                for var in unit:
+                    if domains[var] & val:
+                        if domains[var] != val:
+                            domains[var] = val
+                            for cell_unit in CELL_UNITS[var]:
+                                dirty[cell_unit] = 1
+                            if not in_queue[var]:
+                                in_queue[var] = 1
+                                to_do.append(var)
+                        break
+    return True
+
+def _solve(domains, to_do):
+    """
+    domains is an array of 81 domain masks indexed by variable, and is
+    modified in place. to_do is an iterable of variables whose domains
+    have changed.
+    Depth-first search with an explicit stack: each state is propagated,
+    then the most constrained variable is split on its lowest value.
+    Returns the solved domains (every domain a single bit) or None if
+    there is no solution.
+    """
+    stack = [(domains, to_do)]
+    while stack:
+        domains, to_do = stack.pop()
+        if not _propagate(domains, to_do):
+            continue
+
+        # Most constrained variable: the smallest domain with more than one value.
+        best_var, best_size = None, 10
+        for var in range(0, 81):
+            size = POPCOUNT[domains[var]]
+            if 1 < size < best_size:
+                best_var, best_size = var, size
+                if size == 2: # cannot do better than two values
+                    break
+        if best_var is None:
+            return domains # solution - every domain is a single bit.
+
+        # Branch on var = v, then var != v for the lowest value v. Only var
+        # changed, so propagation is seeded with it alone. The var != v
+        # branch reuses domains instead of copying it again.
+        val = domains[best_var] & -domains[best_var]
+        branch = domains[:] # an array slice is a flat copy
+        branch[best_var] = val
+        domains[best_var] &= ~val
+        stack.append((domains, (best_var,)))
+        stack.append((branch, (best_var,))) # pushed last, so tried first
+    return None
 
 class Sudoku(object):
     def __init__(self, puzzle):
         # you may add more attributes if you need
         self.puzzle = puzzle # self.puzzle is a list of lists
-        self.ans = copy.deepcopy(puzzle) # self.ans is a list of lists
-        self.domains = dict(((r,c),[x for x in range(1, 10)]) for r in range(0, len(self.puzzle)) for c in range(0, len(self.puzzle[r])))
-        # Assigns knowns values to variables
-        for i in range(0, len(self.puzzle)):
-           for j in range(0, len(self.puzzle[i])):
-               if self.puzzle[i][j] != 0:
-                   self.domains[(i,j)] = [self.puzzle[i][j]] 
-                
-        self.constraints = [Constraint([(i, j) for j in range(0, 9)] , is_all_unique) for i in range(0, 9)] + [Constraint([(i, j) for i in range(0, 9)] , is_all_unique) for j in range(0, 9)] + [Constraint(box_to_indices(q), is_all_unique) for q in range(0, 9)] # constraints for the 9 boxes
-        self.csp = CSP(self.domains, self.constraints)
+        self.ans = [row[:] for row in puzzle] # self.ans is a list of lists
+        # A domain is a 9-bit mask: bit i set means digit i+1 is still possible.
+        # Domains are packed into a flat array of 81 masks indexed by row * 9 + col,
+        # so snapshotting them while searching is a single slice.
+        self.domains = array('H', [DIGIT_MASK[val] for row in self.puzzle for val in row])
 
     def solve(self):
         #TODO: Your code here
-        solver = Solver(self.csp)
-        solutions = solver.solve_recursive_ds() # or solve_recursive_ds()
-        self.ans = [[0 for a in range(10)] for b in range(10)]
-        for pos, val in solutions.items():
-            self.ans[pos[0]][pos[1]] = val
+        solutions = _solve(self.domains[:], range(0, 81))
+        # self.ans starts as a copy of the puzzle and is left as is if the
+        # puzzle has no solution.
+        if solutions is not None:
+            for pos, mask in enumerate(solutions):
+                self.ans[pos // 9][pos % 9] = mask.bit_length() # unpack the single bit back to its digit
         # don't print anything here. just return the answer
         # self.ans is a list of lists
         return self.ans